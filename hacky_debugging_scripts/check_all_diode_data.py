@@ -25,7 +25,7 @@ if __name__ == '__main__':
         else:
             fig, axes = plt.subplots(1, len(session_files), figsize=(8 * len(session_files), 5), sharey=True)
             for i, (session_file, session_path) in enumerate(session_files):
-                diode_df = format_diode_df(os.path.join(session_path, session_file))
+                diode_df = format_diode_df(os.path.join(session_path, session_file)).to_pandas()
                 if len(session_files) > 1:
                     axes[i].plot(diode_df.time, diode_df.light_value)
                     axes[i].set_xlabel("Time")
@@ -43,7 +43,7 @@ if __name__ == '__main__':
     fig, axes = plt.subplots(1, len(session_files), figsize=(8 * len(session_files), 5))
     for i, (session_file, session_path) in enumerate(session_files):
         # diode_df = load_diode_data(participant_id, session_id)
-        diode_df = format_diode_df(os.path.join(session_path, session_file))
+        diode_df = format_diode_df(os.path.join(session_path, session_file)).to_pandas()
         axes.plot(diode_df.time, diode_df.light_value)
         axes.set_xlabel("Time")
         axes.set_ylabel("Diode Brightness")
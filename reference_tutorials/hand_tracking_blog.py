@@ -1,5 +1,12 @@
+import os
+import sys
 import cv2
+import queue
+import threading
+import numpy as np
 import mediapipe as mp
+sys.path.insert(0, os.path.abspath(".."))
+from utils.data_loading import open_video
 
 
 # Reference
@@ -11,11 +18,20 @@ mpHands = mp.solutions.hands
 hands = mpHands.Hands()
 mpDraw = mp.solutions.drawing_utils
 
+# Frame rate at which frames are passed to MediaPipe
+TARGET_FPS = 30
+
+# Print the coordinates of each landmark
+DEBUG = False
+
+# Number of decoded frames that can wait for hand tracking
+FRAME_QUEUE_SIZE = 4
+
 
 # Processing the input image
-def process_image(img):
-    # Converting the input to grayscale
-    rgb_image = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+def process_image(img, rgb_image):
+    # Converting the input to RGB (into a preallocated buffer)
+    cv2.cvtColor(img, cv2.COLOR_BGR2RGB, dst=rgb_image)
     results = hands.process(rgb_image)
 
     # Returning the detected hands to calling function
@@ -25,33 +41,65 @@ def process_image(img):
 # Drawing landmark connections
 def draw_hand_connections(img, results):
     if results.multi_hand_landmarks:
+        h, w, c = img.shape
         for handLms in results.multi_hand_landmarks:
             for ind, lm in enumerate(handLms.landmark):
-                h, w, c = img.shape
-
                 # Finding the coordinates of each landmark
                 cx, cy = int(lm.x * w), int(lm.y * h)
 
                 # Printing each landmark ID and coordinates on the terminal
-                print(ind, cx, cy)
+                if DEBUG:
+                    print(ind, cx, cy)
 
                 # Creating a circle around each landmark
                 cv2.circle(img, (cx, cy), 10, (0, 255, 0), cv2.FILLED)
-                # Drawing the landmark connections
-                mpDraw.draw_landmarks(img, handLms, mpHands.HAND_CONNECTIONS)
+
+            # Drawing the landmark connections (once per hand)
+            mpDraw.draw_landmarks(img, handLms, mpHands.HAND_CONNECTIONS)
 
         return img
 
 
+# Decoding the sampled frames (runs in a separate thread)
+def read_frames(cap, n_skip, frame_queue, stop_reading):
+    # OpenCV can grab a frame without converting it to an image, ffmpegcv readers must read it
+    skip_frame = cap.grab if isinstance(cap, cv2.VideoCapture) else cap.read
+
+    try:
+        while not stop_reading.is_set():
+            # Skip the frames that are not sampled, then take the input
+            for _ in range(n_skip):
+                skip_frame()
+            success, image = cap.read()
+            if not success:
+                break
+            frame_queue.put(image)
+    finally:
+        # Signals the end of the video
+        frame_queue.put(None)
+
+
 def main():
     # Replace 0 with the video path to use a  pre-recorded video
-    cap = cv2.VideoCapture('data/original_data/P17/A1/P17_A1.mp4')
-
-    while True:
-        # Taking the input
-        success, image = cap.read()
+    video_path = '../data/original_data/P17/A1/P17_A1.mp4'
+    fps_cap = cv2.VideoCapture(video_path)
+    source_fps = fps_cap.get(cv2.CAP_PROP_FPS)
+    fps_cap.release()
+    n_skip = max(round(source_fps / TARGET_FPS) - 1, 0)
+    cap = open_video(video_path)
+
+    # Decode frames while the previous frames are being tracked
+    frame_queue = queue.Queue(maxsize=FRAME_QUEUE_SIZE)
+    stop_reading = threading.Event()
+    reader = threading.Thread(target=read_frames, args=(cap, n_skip, frame_queue, stop_reading), daemon=True)
+    reader.start()
+
+    rgb_image = None
+    while (image := frame_queue.get()) is not None:
         # image = imutils.resize(image, width=500, height=500)
-        results = process_image(image)
+        if rgb_image is None:
+            rgb_image = np.empty_like(image)
+        results = process_image(image, rgb_image)
         draw_hand_connections(image, results)
 
         # Displaying the output
@@ -59,8 +107,15 @@ def main():
 
         # Program terminates when q key is pressed
         if cv2.waitKey(1) == ord('q'):
-            cap.release()
-            cv2.destroyAllWindows()
+            break
+
+    # Stop the reader and empty the queue, so it is not blocked before the video is released
+    stop_reading.set()
+    while image is not None:
+        image = frame_queue.get()
+    reader.join()
+    cap.release()
+    cv2.destroyAllWindows()
 
 
 if __name__ == "__main__":
@@ -28,7 +28,13 @@ import matplotlib.pyplot as plt
 from scipy.interpolate import splrep, BSpline
 
 sys.path.insert(0, os.path.abspath(".."))
-from utils.calculations import MIN_POSITION, get_basis_vectors, calculate_time_derivative
+from utils.calculations import (
+    MIN_POSITION,
+    build_ref_array,
+    get_basis_vectors,
+    precompute_basis,
+    calculate_time_derivative,
+)
 from utils.data_loading import load_pipeline_config, get_files_containing
 from utils.pipeline import SessionData, load_session_data
 
@@ -118,28 +124,16 @@ class TransformedHandData:
                 lm_xy = interpolate_pos(time_vec, lm_pos[lm])[:, ind0:]
                 transformed_lm_pos[lm] = lm_xy - interp_ref_pos[reference_tag_id]
 
-            # Rotate the frame to be square to the apparatus' AprilTags
-            position_shape = interp_ref_pos[reference_tag_id].shape
-            # transformed_lm_pos = {lm: np.zeros(position_shape) for lm in session_data.tracked_landmarks.values()}
-            rotated_ref_pos = {tag: np.zeros(position_shape) for tag in session_data.apparatus_tag_ids}
-
-            for i in range(position_shape[1]):
-                # Calculate the transformation matrix for each frame
-                transformation_matrix = get_transformation_matrix(
-                    interp_ref_pos,
-                    i,
-                    session_data.apparatus_tag_ids,
-                    reference_scale_matrix,
-                )
-
-                # Transform hand landmarks
-                for lbl, lm in session_data.tracked_landmarks.items():
-                    # Transform the coordinates into the reference frame
-                    transformed_lm_pos[lm][:, i] = transformation_matrix @ transformed_lm_pos[lm][:, i]
-
-                # Transform reference AprilTags
-                for tag_id in session_data.apparatus_tag_ids:
-                    rotated_ref_pos[tag_id][:, i] = transformation_matrix @ interp_ref_pos[tag_id][:, i]
+            # Calculate the transformation matrix for each frame -> (n_frames, 2, 2)
+            ref_array, tag_rows = build_ref_array(interp_ref_pos, session_data.apparatus_tag_ids)
+            basis_v1, basis_v2 = precompute_basis(ref_array)
+            transformation_matrices = get_transformation_matrices(basis_v1, basis_v2, reference_scale_matrix)
+
+            # Rotate the hand landmarks and reference AprilTags to be square to the apparatus' AprilTags
+            for lm in session_data.tracked_landmarks.values():
+                transformed_lm_pos[lm] = np.einsum("tij,jt->it", transformation_matrices, transformed_lm_pos[lm])
+            rotated_ref_array = np.einsum("tij,kjt->kit", transformation_matrices, ref_array)
+            rotated_ref_pos = {tag_id: rotated_ref_array[row] for tag_id, row in tag_rows.items()}
 
             if plot_landmarks is not None:
                 landmark_names_ids = {name: lm for name, lm in self.hand_landmarks.items() if lm in plot_landmarks}
@@ -170,27 +164,21 @@ class TransformedHandData:
             # Interpolate the time to be used in the spline (video resolution is too low for differentiation)
             time_interpolated = np.arange(block_time[0], block_time[-1], DT_SPEED)
 
-            lm_pos_interpolated = {}
-            lm_hand_speed = {}
-            # lm_hand_acc = {}
-            for landmark_name, landmark_id in self.hand_landmarks.items():
-                # Separate the x and y position data into 1D vectors
-                x_tip, y_tip = hand_pos[landmark_id][0, :], hand_pos[landmark_id][1, :]
-
-                # Fit a cubic spline to the position data
-                x_spline = cubic_spline_filter(block_time, x_tip, time_interpolated, SMOOTHING)
-                y_spline = cubic_spline_filter(block_time, y_tip, time_interpolated, SMOOTHING)
-                nan_mask = np.isnan(x_spline)
-                time_interpolated = time_interpolated[~nan_mask]
-                x_spline = x_spline[~nan_mask]
-                y_spline = y_spline[~nan_mask]
-                lm_pos_interpolated[landmark_id] = np.stack((x_spline, y_spline), axis=0)
-
-                # Calculate the x, y and combined speeds
-                x_speed = calculate_time_derivative(time_interpolated, x_spline)
-                y_speed = calculate_time_derivative(time_interpolated, y_spline)
-                total_speed = np.sqrt(x_speed ** 2 + y_speed ** 2)
-                lm_hand_speed[landmark_id] = np.stack((x_speed, y_speed, total_speed), axis=0)
+            # Fit a cubic spline to the x and y position data of each landmark -> (n_landmarks, 2, n_times)
+            landmark_ids = list(self.hand_landmarks.values())
+            pos_splines = np.stack([
+                [cubic_spline_filter(block_time, hand_pos[lm][ax, :], time_interpolated, SMOOTHING) for ax in range(2)]
+                for lm in landmark_ids
+            ])
+            nan_mask = np.isnan(pos_splines).any(axis=(0, 1))
+            time_interpolated = time_interpolated[~nan_mask]
+            pos_splines = pos_splines[:, :, ~nan_mask]
+
+            # Calculate the x, y and combined speeds of all landmarks at once
+            velocities = calculate_time_derivative(time_interpolated, pos_splines)
+            total_speeds = np.hypot(velocities[:, 0, :], velocities[:, 1, :])
+            lm_pos_interpolated = {lm: pos_splines[i] for i, lm in enumerate(landmark_ids)}
+            lm_hand_speed = {lm: np.vstack((velocities[i], total_speeds[i])) for i, lm in enumerate(landmark_ids)}
 
             self.time_interpolated.append(time_interpolated)
             self.hand_pos_interpolated.append(lm_pos_interpolated)
@@ -219,13 +207,12 @@ def interpolate_pos(time_data: np.ndarray, position_data: np.ndarray) -> np.ndar
         return np.stack((x_interp, y_interp))
 
 
-def get_transformation_matrix(
-        reference_tag_pos: dict[int, np.ndarray],
-        index: int,
-        reference_tag_ids: list[int],
+def get_transformation_matrices(
+        basis_v1: np.ndarray,
+        basis_v2: np.ndarray,
         reference_scale_matrix: np.ndarray,
 ) -> np.ndarray:
-    """Calculates a transformation matrix, given a set of basis coordinates and scaling matrix.
+    """Calculates the transformation matrices of every frame, given the basis vectors and scaling matrix.
 
     The transformation accounts for both the conversion from the pixel frame of reference to the apparatus
     frame of reference, as well as scaling by a global scaling factor that is consistent across all
@@ -235,19 +222,18 @@ def get_transformation_matrix(
     the distance between the top-left corners of the top two AprilTags (IDs 40 and 10).
 
     Parameters
-        reference_coordinates (dict[int, np.ndarray]): AprilTag reference coordinates (top-left corner)
-        index (int): video frame index to calculate for
-        reference_tag_ids (list[int]): AprilTag IDs used as reference points (origin, y-dir, x-dir)
+        basis_v1 (np.ndarray): basis vectors in the x-direction, shape (2, n_frames)
+        basis_v2 (np.ndarray): basis vectors in the y-direction, shape (2, n_frames)
         reference_scale_matrix (np.ndarray): reference scaling matrix
 
     Returns
-        (np.ndarray): matrix that performs a basis transformation and scaling when multiplied on the left
+        (np.ndarray): matrices, shape (n_frames, 2, 2), that perform a basis transformation and scaling
+            when multiplied on the left
     """
 
-    basis_v1, basis_v2 = get_basis_vectors(reference_tag_pos, index, reference_tag_ids)
-    rotation_matrix = np.stack((basis_v1, basis_v2)).T
+    rotation_matrices = np.stack((basis_v1.T, basis_v2.T), axis=-1)
 
-    return np.linalg.inv(rotation_matrix @ reference_scale_matrix)
+    return np.linalg.inv(rotation_matrices @ reference_scale_matrix)
 
 
 def get_scaling_matrix(
@@ -274,7 +260,8 @@ def get_scaling_matrix(
         (np.ndarray): scaling matrix for a given set of basis vectors
     """
 
-    basis_v1, basis_v2 = get_basis_vectors(reference_coordinates, index, reference_tag_ids)
+    ref_array, _ = build_ref_array(reference_coordinates, reference_tag_ids)
+    basis_v1, basis_v2 = get_basis_vectors(ref_array, index)
 
     return np.diag([1 / np.linalg.norm(basis_v1), BASIS_RATIO / np.linalg.norm(basis_v1)])
 
@@ -755,13 +755,31 @@ def is_trial_usable(
 
     # If there are an unacceptable number of consecutive missed detections of the reference AprilTags
     for tag_id, reference_tag_pos in apriltag_ref_pos.items():
-        tag_zero_runs = find_zero_runs(reference_tag_pos[0, trial_inds])
-        if tag_zero_runs.size > 0:
+        if longest_zero_run(reference_tag_pos[0, trial_inds]) > MAX_ZERO_DT:
             trial_data.trial_usable = False
             unusable_counts["AprilTags Undetected"] += 1
             return None
 
 
+def longest_zero_run(data: np.ndarray) -> int:
+    """Finds the length of the longest run of consecutive zeros in a 1D array.
+
+    The index of the most recent nonzero element is carried forward with a running maximum, so the
+    length of the current zero run at each element is its distance from that index. It is used in
+    place of find_zero_runs when only the length of the longest run is needed.
+
+    Parameters
+        data (np.ndarray): data in which to find consecutive zeros
+
+    Returns
+        (int): number of elements in the longest run of zeros
+    """
+
+    inds = np.arange(data.size)
+    last_nonzero_inds = np.maximum.accumulate(np.where(data != 0, inds, -1))
+    return int(np.max(inds - last_nonzero_inds, initial=0))
+
+
 def find_zero_runs(data: np.ndarray) -> np.ndarray:
     """Finds the indices of consecutive zeros greater than a minimum length in a 1D array.
 
@@ -5,13 +5,24 @@ files, changing column names, interpolating missing rows, and zeroing the time."
 import os
 import cv2
 import sys
+import json
 import time
+import queue
 import argparse
+import tempfile
+import threading
+import subprocess
 import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from pyarrow import csv
 from pathlib import Path
 sys.path.insert(0, os.path.abspath(".."))
-from utils.data_loading import get_files_containing
+from utils.data_loading import get_files_containing, open_video
+
+
+FRAME_QUEUE_SIZE = 64
 
 
 def concatenate_video_data(froot: str) -> None:
@@ -38,39 +49,159 @@ def concatenate_video_data(froot: str) -> None:
         new_filename = os.path.join(new_dirpath, f"{participant_id}_{session_id}.mp4")
         if not os.path.exists(new_filename) and len(file_list) > 1:
             print(f"Processing videos: {file_list}")
-            # Initialize a new video writer
-            vcap = cv2.VideoCapture(os.path.join(dirpath, file_list[0]))
-            width = int(vcap.get(cv2.CAP_PROP_FRAME_WIDTH))
-            height = int(vcap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-            fps = vcap.get(cv2.CAP_PROP_FPS)
-            codec = int(vcap.get(cv2.CAP_PROP_FOURCC))
-            vcap.release()
-            cv2.destroyAllWindows()
-            new_video = cv2.VideoWriter(new_filename, codec, fps, (width, height))
-
-            # Write the video parts to a single file
-            video_frame_reported = 0
-            video_frame_cnt = 0
+            part_paths = [os.path.join(dirpath, file) for file in file_list]
             run_time_t0 = time.time()
-            for file in file_list:
-                vcap = cv2.VideoCapture(os.path.join(dirpath, file))
-                video_frame_reported += int(vcap.get(cv2.CAP_PROP_FRAME_COUNT))
-                while vcap.isOpened():
-                    # Read the next frame
-                    ret, frame = vcap.read()
-                    if not ret:
-                        break
-                    video_frame_cnt += 1
-                    new_video.write(frame)
-                vcap.release()
-                cv2.destroyAllWindows()
+            # Each part is probed once, since counting the packets reads through the whole file
+            stream_infos = [probe_video_stream(path) for path in part_paths]
+            video_frame_reported = sum(info["nb_read_packets"] for info in stream_infos)
+            if video_streams_match(part_paths, stream_infos):
+                remux_video_parts(part_paths, new_filename, video_frame_reported)
+            else:
+                print("Video parts have different stream formats, re-encoding instead")
+                reencode_video_parts(part_paths, new_filename, video_frame_reported)
             print(f"It took {time.time() - run_time_t0:0.2f} seconds to concatenate videos")
-            assert video_frame_cnt == video_frame_reported
         elif len(file_list) == 1:
             print(f"Moving video: '{file_list[0]}'")
             os.rename(os.path.join(dirpath, file_list[0]), os.path.join(new_dirpath, file_list[0]))
 
 
+def probe_video_stream(video_path: str) -> dict[str, str | int]:
+    """Reads the video stream metadata of a file using ffprobe.
+
+    The packets of the video stream are counted, rather than using the frame count reported in the
+    container header, since the header value is not always reliable.
+
+    Parameters
+        video_path (str): relative path to the video file
+
+    Returns
+        (dict[str, str | int]): codec name, frame width, frame height and number of video packets
+    """
+
+    probe_cmd = [
+        "ffprobe", "-v", "error",
+        "-select_streams", "v:0",
+        "-count_packets",
+        "-show_entries", "stream=codec_name,width,height,nb_read_packets",
+        "-of", "json",
+        video_path,
+    ]
+    probe_result = subprocess.run(probe_cmd, capture_output=True, text=True, check=True)
+    stream_info = json.loads(probe_result.stdout)["streams"][0]
+    stream_info["nb_read_packets"] = int(stream_info["nb_read_packets"])
+    return stream_info
+
+
+def video_streams_match(video_paths: list[str], stream_infos: list[dict[str, str | int]]) -> bool:
+    """Checks whether all video parts can be concatenated without re-encoding.
+
+    Parameters
+        video_paths (list[str]): relative paths to the video parts
+        stream_infos (list[dict[str, str | int]]): video stream metadata of each part (see probe_video_stream)
+
+    Returns
+        (bool): True if all parts share the same container, codec and frame size
+    """
+
+    if len({Path(path).suffix.lower() for path in video_paths}) > 1:
+        return False
+    stream_formats = {(info["codec_name"], info["width"], info["height"]) for info in stream_infos}
+    return len(stream_formats) == 1
+
+
+def remux_video_parts(video_paths: list[str], new_filename: str, video_frame_reported: int) -> None:
+    """Concatenates video parts by copying their streams with the ffmpeg concat demuxer.
+
+    No frames are decoded or encoded, so this only works if all parts share the same stream format.
+
+    Reference: https://trac.ffmpeg.org/wiki/Concatenate
+
+    Parameters
+        video_paths (list[str]): relative paths to the video parts, in order
+        new_filename (str): relative path of the concatenated video
+        video_frame_reported (int): total number of video packets in the video parts
+    """
+
+    # The concat demuxer reads the parts from a list file (single quotes in paths must be escaped)
+    with tempfile.NamedTemporaryFile("w", suffix="_concat_list.txt", delete=False) as list_file:
+        for path in video_paths:
+            escaped_path = os.path.abspath(path).replace("'", "'\\''")
+            list_file.write(f"file '{escaped_path}'\n")
+        list_path = list_file.name
+    try:
+        concat_cmd = [
+            "ffmpeg", "-hide_banner", "-loglevel", "error",
+            "-f", "concat", "-safe", "0",
+            "-i", list_path,
+            "-c", "copy",
+            new_filename,
+        ]
+        subprocess.run(concat_cmd, check=True)
+    finally:
+        os.remove(list_path)
+
+    video_frame_cnt = probe_video_stream(new_filename)["nb_read_packets"]
+    assert video_frame_cnt == video_frame_reported
+
+
+def reencode_video_parts(video_paths: list[str], new_filename: str, video_frame_reported: int) -> None:
+    """Concatenates video parts by decoding each frame and writing it to a new video.
+
+    This is much slower than remuxing, and is only used if the video parts have different stream formats.
+
+    Parameters
+        video_paths (list[str]): relative paths to the video parts, in order
+        new_filename (str): relative path of the concatenated video
+        video_frame_reported (int): total number of video packets in the video parts
+    """
+
+    # Initialize a new video writer
+    vcap = cv2.VideoCapture(video_paths[0])
+    width = int(vcap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(vcap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    fps = vcap.get(cv2.CAP_PROP_FPS)
+    codec = int(vcap.get(cv2.CAP_PROP_FOURCC))
+    vcap.release()
+    cv2.destroyAllWindows()
+    new_video = cv2.VideoWriter(new_filename, codec, fps, (width, height))
+
+    # Decode the video parts in a separate thread, so that decoding overlaps with encoding
+    frame_queue = queue.Queue(maxsize=FRAME_QUEUE_SIZE)
+    reader = threading.Thread(target=read_video_frames, args=(video_paths, frame_queue), daemon=True)
+    reader.start()
+
+    # Write the video parts to a single file
+    video_frame_cnt = 0
+    while (frame := frame_queue.get()) is not None:
+        video_frame_cnt += 1
+        new_video.write(frame)
+    reader.join()
+    new_video.release()
+    assert video_frame_cnt == video_frame_reported
+
+
+def read_video_frames(video_paths: list[str], frame_queue: queue.Queue) -> None:
+    """Decodes the frames of each video part and puts them on a queue, followed by None when finished.
+
+    Parameters
+        video_paths (list[str]): relative paths to the video parts, in order
+        frame_queue (queue.Queue): bounded queue that the decoded frames are put on
+    """
+
+    try:
+        for path in video_paths:
+            vcap = open_video(path)
+            while vcap.isOpened():
+                # Read the next frame
+                ret, frame = vcap.read()
+                if not ret:
+                    break
+                frame_queue.put(frame)
+            vcap.release()
+    finally:
+        frame_queue.put(None)
+
+
 def concatenate_gaze_data(froot: str) -> None:
     """Concatenates all two part gaze videos.
 
@@ -96,16 +227,15 @@ def concatenate_gaze_data(froot: str) -> None:
         if os.path.exists(new_filename):
             print(f"File already exists: {new_filename}")
             continue
-        session_gaze_dfs = []
-        for i, file in enumerate(file_list):
-            gaze_df = preprocess_gaze_data(os.path.join(dirpath, file), False)
-            if i > 0:
-                time_diff = session_gaze_dfs[-1].time.diff().median()
-                gaze_df['time'] += session_gaze_dfs[-1].time.iloc[-1] + time_diff
-                gaze_df.video_frame += session_gaze_dfs[-1].video_frame.iloc[-1] + 1
-            session_gaze_dfs.append(gaze_df)
-        combined_gaze_df = pd.concat(session_gaze_dfs, ignore_index=True)
-        combined_gaze_df.time.to_csv(new_filename, index=False)
+        session_gaze_tables = []
+        time_offset = 0.0
+        for file in file_list:
+            # Only the time column is saved, and the parts are concatenated without copying their data
+            gaze_time = preprocess_gaze_data(os.path.join(dirpath, file), False).time.to_numpy()
+            session_gaze_tables.append(pa.table({'time': gaze_time + time_offset}))
+            time_offset = next_part_time_offset(gaze_time, time_offset)
+        combined_gaze_table = pa.concat_tables(session_gaze_tables)
+        csv.write_csv(combined_gaze_table, new_filename)
 
 
 def preprocess_diode_data(froot: str) -> None:
@@ -135,18 +265,37 @@ def preprocess_diode_data(froot: str) -> None:
         if os.path.exists(new_filename):
             print(f"File already exists: {new_filename}")
             continue
-        session_diode_dfs = []
+        session_diode_tables = []
+        time_offset = 0.0
         for i, file in enumerate(file_list):
-            diode_df = format_diode_df(os.path.join(dirpath, file))
+            diode_table = format_diode_df(os.path.join(dirpath, file))
+            part_time = diode_table['time'].to_numpy()
             if i > 0:
-                time_diff = session_diode_dfs[-1].time.diff().median()
-                diode_df.time += session_diode_dfs[-1].time.iloc[-1] + time_diff
-            session_diode_dfs.append(diode_df)
-        combined_diode_df = pd.concat(session_diode_dfs, ignore_index=True)
-        combined_diode_df.to_csv(new_filename, index=False)
+                diode_table = diode_table.set_column(0, 'time', pc.add(diode_table['time'], time_offset))
+            time_offset = next_part_time_offset(part_time, time_offset)
+            session_diode_tables.append(diode_table)
+        combined_diode_table = pa.concat_tables(session_diode_tables)
+        csv.write_csv(combined_diode_table, new_filename)
+
+
+def next_part_time_offset(part_time: np.ndarray, part_time_offset: float) -> float:
+    """Calculates the time offset of the next file part in a multi-part session.
+
+    The next part is assumed to start one (median) time step after the current part ends. The offset
+    is calculated from the time of the current part as it is read, before its own offset is applied.
+
+    Parameters
+        part_time (np.ndarray): time of the current file part, starting at zero
+        part_time_offset (float): time offset added to the current file part
+
+    Returns
+        (float): time to add to the next file part
+    """
+
+    return float(part_time_offset + part_time[-1] + np.median(np.diff(part_time)))
 
 
-def format_diode_df(diode_path: str) -> pd.DataFrame:
+def format_diode_df(diode_path: str) -> pa.Table:
     """Format the light diode sensor data of a particular session.
 
     Parameters
@@ -154,13 +303,14 @@ def format_diode_df(diode_path: str) -> pd.DataFrame:
         diode_suffix (str): additional filename identifier
 
     Returns
-        diode_df (pd.DataFrame): processed diode data
+        diode_table (pa.Table): processed diode data
     """
 
-    diode_df = pd.read_csv(diode_path, usecols=[' timestamp', ' light_value'])
-    diode_df.columns = ['time', 'light_value']
-    diode_df.time = diode_df.time - diode_df.time.iloc[0]
-    return diode_df
+    convert_options = csv.ConvertOptions(include_columns=[' timestamp', ' light_value'])
+    diode_table = csv.read_csv(diode_path, convert_options=convert_options)
+    diode_table = diode_table.rename_columns(['time', 'light_value'])
+    diode_time = diode_table['time']
+    return diode_table.set_column(0, 'time', pc.subtract(diode_time, diode_time[0]))
 
 
 def preprocess_gaze_data(gaze_path: str, plot_result: bool) -> pd.DataFrame:
@@ -212,50 +362,38 @@ def add_missing_gaze_rows(gaze_data: pd.DataFrame, plot_result: bool) -> pd.Data
     """
 
     # Find the median time step in the data
-    dt_median = gaze_data.time.diff().median()
-
-    # Interpolate missing frames in gaze data
-    gaze_data_updated = gaze_data.copy()
-    gaze_data_old = gaze_data.copy()
-    gap_inds_old = list(gaze_data_updated.index[gaze_data_updated.video_frame.diff() > 1])
-    gap_inds_updated = []
-    gap_lens = []
-
-    # While there are still missing rows in the gaze data
-    while list(gaze_data_updated.index[gaze_data_updated.video_frame.diff() > 1]):
-        # Calculate frame indices
-        first_frame_ind = gaze_data_updated.index[gaze_data_updated.video_frame.diff() > 1][0] - 1
-        frame_prev = gaze_data_updated.iloc[first_frame_ind]
-        frame_next = gaze_data_updated.iloc[first_frame_ind + 1]
-        n_missing_frames = round(frame_next.video_frame - frame_prev.video_frame)
-        gap_inds_updated.append(first_frame_ind)
-        gap_lens.append(n_missing_frames)
-
-        # Calculate frame time information
-        time_diff = frame_next.time - frame_prev.time
-        n_dts = round(time_diff / dt_median)
-
-        # Calculate the number of dropped frames
-        n_dropped_frames = n_dts - n_missing_frames
-
-        # Calculate the number of rows that must be inserted
-        n_new_times = n_dts - n_dropped_frames
-
-        # Insert rows into the DataFrame at the proper frame index
-        new_df_locs = np.arange(frame_prev.video_frame, frame_prev.video_frame + 1, 1 / n_new_times)[1:]
-        new_times = np.arange(frame_prev.time, frame_next.time, dt_median)[1:n_new_times]
-        for i, (loc, t) in enumerate(zip(new_df_locs, new_times)):
-            gaze_data_updated.loc[loc] = [t, frame_prev.video_frame + i + 1]
-        gaze_data_updated = gaze_data_updated.sort_index().reset_index(drop=True)
+    video_frames = gaze_data.video_frame.to_numpy()
+    frame_times = gaze_data.time.to_numpy()
+    dt_median = np.median(np.diff(frame_times))
+
+    # Find the frame gaps in the gaze data
+    gap_inds = np.flatnonzero(np.diff(video_frames) > 1)
+    gap_lens = np.round(video_frames[gap_inds + 1] - video_frames[gap_inds]).astype(int)
+
+    # Each missing frame is assigned a time one median time step after the frame before it. Any
+    # time steps in excess of the number of missing frames (dropped frames) are left at the end of the gap
+    n_new_rows = gap_lens - 1
+    gap_starts = np.repeat(np.cumsum(n_new_rows) - n_new_rows, n_new_rows)
+    gap_steps = np.arange(n_new_rows.sum()) - gap_starts + 1
+    new_frames = np.repeat(video_frames[gap_inds], n_new_rows) + gap_steps
+    new_times = np.repeat(frame_times[gap_inds], n_new_rows) + gap_steps * dt_median
+
+    # Insert the new rows after the frame preceding each gap
+    insert_inds = np.repeat(gap_inds + 1, n_new_rows)
+    gaze_data_updated = pd.DataFrame({
+        'time': np.insert(frame_times, insert_inds, new_times),
+        'video_frame': np.insert(video_frames, insert_inds, new_frames),
+    })
 
     # Check after insertion that the number of frames equals the last frame index
     assert len(gaze_data_updated) == int(gaze_data.video_frame.iloc[-1] + 1)
 
     # Check the interpolation
     if plot_result:
-        for ind1, ind2, length in zip(gap_inds_old, gap_inds_updated, gap_lens):
+        gap_inds_updated = video_frames[gap_inds]
+        for ind1, ind2, length in zip(gap_inds + 1, gap_inds_updated, gap_lens):
             # Before adding frames
-            print(gaze_data_old.iloc[ind1 - 2:ind1 + 2])
+            print(gaze_data.iloc[ind1 - 2:ind1 + 2])
             # After adding frames
             print(gaze_data_updated.iloc[ind2 - 2:ind2 + length + 2])
             print()
@@ -7,7 +7,7 @@ import numpy as np
 import matplotlib.pyplot as plt
 
 sys.path.insert(0, os.path.abspath(".."))
-from utils.calculations import get_basis_vectors
+from utils.calculations import build_ref_array, get_basis_vectors
 from utils.data_loading import load_block_video_mp4
 from utils.pipeline import load_session_data, INDEX_FINGER_TIP_ID
 
@@ -56,6 +56,7 @@ if __name__ == "__main__":
 
     # Define the reference postions
     ref_pos = session_data.reference_pos_abs[args.block]
+    ref_array, _ = build_ref_array(ref_pos, session_data.apparatus_tag_ids)
     reference_tag_id = session_data.apparatus_tag_ids[0]
 
     # Define the position of the index fingertip
@@ -84,7 +85,7 @@ if __name__ == "__main__":
             ax.imshow(frame_rgb)
 
             # Calculate the transformation matrix for each frame
-            basis_v1, basis_v2 = get_basis_vectors(ref_pos, i, session_data.apparatus_tag_ids)
+            basis_v1, basis_v2 = get_basis_vectors(ref_array, i)
             rotation_matrix = np.stack((basis_v1, basis_v2)).T
             transformation_matrix = np.linalg.inv(rotation_matrix @ scale_matrix)
 
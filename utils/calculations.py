@@ -33,13 +33,12 @@ def get_top_left_coords(corners: list[list]):
         corners (list[list]): list of the rectangle's vertices
 
     Returns
-        top_left_ind (int): index of the top left corner coordinates
+        (np.ndarray): coordinates of the top left corner
     """
 
-    min_y_inds = np.argsort(corners[:, 1])[:2]
-    min_y_corners = corners[min_y_inds, :]
-    min_x_ind = np.argmin(min_y_corners[:, 0])
-    return min_y_corners[min_x_ind, :]
+    corners = np.asarray(corners)
+    min_y_corners = corners[np.argpartition(corners[:, 1], 1)[:2]]
+    return min_y_corners[np.argmin(min_y_corners[:, 0])]
 
 
 def distance_2d(x1: float, y1: float, x2: float = 0, y2: float = 0):
@@ -55,46 +54,79 @@ def distance_2d(x1: float, y1: float, x2: float = 0, y2: float = 0):
         dist (float): distance between the points
     """
 
-    return np.sqrt((x1 - x2) ** 2 + (y1 - y2) ** 2)
+    return np.hypot(x1 - x2, y1 - y2)
 
 
 def calculate_time_derivative(time_data: np.ndarray, position_data: np.ndarray) -> np.ndarray:
     """Calculates speed from position data.
 
+    The derivative is taken along the last axis, so stacked position data (e.g. shape (n_landmarks, 2, n_times))
+    can be differentiated in a single call.
+
     Parameters
         time_data (np.ndarray): time vector associated with the postion data
-        position_data (np.ndarray): single dimension positon data
+        position_data (np.ndarray): positon data, with time along the last axis
 
     Returns
-        (np.ndarray): vector of speed at each time point
+        (np.ndarray): speed at each time point, with the same leading dimensions as the position data
     """
 
-    return np.diff(position_data) / np.diff(time_data)
+    return np.diff(position_data, axis=-1) / np.diff(time_data)
 
 
-def get_basis_vectors(
+def build_ref_array(
         reference_coordinates: dict[int, np.ndarray],
-        index: int,
         reference_tag_ids: list[int],
-) -> tuple[np.ndarray, np.ndarray]:
+        dtype: np.dtype | None = None,
+) -> tuple[np.ndarray, dict[int, int]]:
+    """Stacks the reference AprilTag coordinates into a single contiguous array.
+
+    Parameters
+        reference_coordinates (dict[int, np.ndarray]): top-left corner coordinates of the reference AprilTags
+        reference_tag_ids (list[int]): AprilTag IDs used as reference points (origin, y-dir, x-dir)
+        dtype (np.dtype | None): data type of the reference array (defaults to that of the coordinates)
+
+    Returns
+        ref_array (np.ndarray): reference coordinates, shape (n_tags, 2, n_frames), in the order of the tag IDs
+        tag_rows (dict[int, int]): row of the reference array (values) associated with each tag ID (keys)
+    """
+
+    ref_array = np.ascontiguousarray(
+        np.stack([reference_coordinates[tag_id] for tag_id in reference_tag_ids]),
+        dtype=dtype,
+    )
+    tag_rows = {tag_id: row for row, tag_id in enumerate(reference_tag_ids)}
+    return ref_array, tag_rows
+
+
+def precompute_basis(ref_array: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Calculates the basis vectors representing the apparatus frame for every video frame at once.
+
+    Parameters
+        ref_array (np.ndarray): reference coordinates, shape (3, 2, n_frames), ordered (origin, y-dir, x-dir)
+
+    Returns
+        basis_v1 (np.ndarray): basis vectors in the x-direction, shape (2, n_frames)
+        basis_v2 (np.ndarray): basis vectors in the y-direction, shape (2, n_frames)
+    """
+
+    origin, point_y, point_x = ref_array
+    return point_x - origin, point_y - origin
+
+
+def get_basis_vectors(ref_array: np.ndarray, index: int) -> tuple[np.ndarray, np.ndarray]:
     """Calculates the basis vectors representing the apparatus frame.
 
     These basis vectors represent a frame of reference defined by the origin and two points.
 
     Parameters
-        reference_coordinates (dict[int, np.ndarray]): top-left corner coordinates of the three reference AprilTags
+        ref_array (np.ndarray): reference coordinates, shape (3, 2, n_frames), ordered (origin, y-dir, x-dir)
         index (int): video frame index to calculate for
-        reference_tag_ids (list[int]): AprilTag IDs used as reference points (origin, y-dir, x-dir)
 
     Returns
         basis_v1 (np.ndarray): basis vector in the x-direction
         basis_v2 (np.ndarray): basis vector in the y-direction
     """
 
-    origin, point_y, point_x = reference_tag_ids
-    basis_v1 = np.array([reference_coordinates[point_x][0, index] - reference_coordinates[origin][0, index],
-                         reference_coordinates[point_x][1, index] - reference_coordinates[origin][1, index]])
-    basis_v2 = np.array([reference_coordinates[point_y][0, index] - reference_coordinates[origin][0, index],
-                         reference_coordinates[point_y][1, index] - reference_coordinates[origin][1, index]])
-
-    return basis_v1, basis_v2
+    origin, point_y, point_x = ref_array[:, :, index]
+    return point_x - origin, point_y - origin
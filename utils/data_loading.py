@@ -4,12 +4,14 @@ import json
 import numpy as np
 import pandas as pd
 from config.config_dataclasses import PipelineConfig, SessionConfig, PostprocessingConfig
+from utils.dtypes import DIODE_DTYPE
 
 
 def get_files_containing(start_dir: str, string_match: str, string_exclude: str = "XXXXXXXXXX"):
     """Returns the files containing a particular string and their relative paths from the project root.
 
-    File paths are relative from a given starting directory.
+    File paths are relative from a given starting directory. The directory tree is walked with
+    os.scandir, so directories are identified from the directory entries, without a stat call per file.
 
     References:
     - https://stackoverflow.com/questions/3207219/how-do-i-list-all-files-of-a-directory
@@ -26,11 +28,23 @@ def get_files_containing(start_dir: str, string_match: str, string_exclude: str
     """
     files = []
     paths = []
-    for (dirpath, dirnames, filenames) in os.walk(start_dir):
-        for file in filenames:
-            if string_match in file and string_exclude not in file:
-                files.append(file)
-                paths.append(dirpath)
+    dir_stack = [start_dir]
+    while dir_stack:
+        dirpath = dir_stack.pop()
+        # Like os.walk, directories that are missing or cannot be read are skipped
+        try:
+            entries = os.scandir(dirpath)
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir():
+                    # Like os.walk, symbolic links to directories are not followed
+                    if not entry.is_symlink():
+                        dir_stack.append(entry.path)
+                elif string_match in entry.name and string_exclude not in entry.name:
+                    files.append(entry.name)
+                    paths.append(dirpath)
     paths_sorted = [path for _, path in sorted(zip(files, paths))]
     files.sort()
     return paths_sorted, files
@@ -47,7 +61,7 @@ def load_diode_data(participant_id: str, session_id: str) -> pd.DataFrame:
         diode_df (pd.DataFrame): processed diode data for a single session
     """
     diode_path = f"../data/pipeline_data/{participant_id}/{session_id}/{participant_id}_{session_id}_diode_sensor.csv"
-    return pd.read_csv(diode_path)
+    return pd.read_csv(diode_path, dtype={"light_value": DIODE_DTYPE})
 
 
 def load_video_time(participant_id: str, session_id: str) -> np.ndarray:
@@ -64,6 +78,32 @@ def load_video_time(participant_id: str, session_id: str) -> np.ndarray:
     return pd.read_csv(time_path).to_numpy('float').squeeze()
 
 
+def open_video(video_path: str):
+    """Opens a video for sequential frame reading, using the fastest available decoder.
+
+    The ffmpegcv readers decode with FFmpeg (NVDEC on NVIDIA GPUs), which is faster than OpenCV's
+    decoder. They only support sequential reading (read, isOpened, release), so video properties must
+    still be read using OpenCV. If ffmpegcv is not installed, an OpenCV video capture is returned.
+
+    Reference: https://github.com/chenxinfeng4/ffmpegcv
+
+    Parameters
+        video_path (str): relative path to the video file
+
+    Returns
+        (ffmpegcv.VideoCapture | cv2.VideoCapture): video reader for the file
+    """
+
+    try:
+        import ffmpegcv
+    except ImportError:
+        return cv2.VideoCapture(video_path)
+    try:
+        return ffmpegcv.VideoCaptureNV(video_path)
+    except Exception:
+        return ffmpegcv.VideoCapture(video_path)
+
+
 def load_video_mp4(participant_id: str, session_id: str) -> cv2.VideoCapture:
     """Loads the preprocessed session video as an OpenCV video capture object.
 
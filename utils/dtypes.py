@@ -0,0 +1,7 @@
+import numpy as np
+
+# Pixel coordinates of the hand landmarks and AprilTags (sub-pixel precision is more than enough)
+COORD_DTYPE = np.float32
+
+# Light diode sensor values
+DIODE_DTYPE = np.int32
@@ -19,6 +19,7 @@ from config.config_dataclasses import PipelineConfig, SessionConfig
 from utils.split_diode_blocks import get_block_data
 from utils.data_loading import load_diode_data, load_video_mp4, load_video_time
 from utils.calculations import get_fourcc, get_top_left_coords
+from utils.dtypes import COORD_DTYPE
 
 
 # Experiment constants
@@ -277,6 +278,8 @@ class VideoProcessingPipeline:
 
         # Initialize variables for analyzing video
         video_frame_cnt = -1
+        frame_grayscale = None
+        frame_rgb = None
 
         # Initialize the classes used to store experimental data
         block_vars = BlockVariables()
@@ -320,9 +323,12 @@ class VideoProcessingPipeline:
                       f"runtime: {time.time() - run_time_t0_5000:0.2f} seconds")
                 run_time_t0_5000 = time.time()
 
-            # Convert frame from BGR to grayscale and RGB
-            frame_grayscale = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            # Convert frame from BGR to grayscale and RGB (into buffers reused for every frame)
+            if frame_rgb is None:
+                frame_grayscale = np.empty(frame.shape[:2], dtype=frame.dtype)
+                frame_rgb = np.empty_like(frame)
+            cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=frame_grayscale)
+            cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=frame_rgb)
             frame_out = frame
 
             # Detect AprilTags
@@ -358,7 +364,7 @@ class VideoProcessingPipeline:
                         block_vars,
                         tags,
                     )
-                    frame_out = cv2.cvtColor(frame_rgb, cv2.COLOR_RGB2BGR)
+                    frame_out = cv2.cvtColor(frame_rgb, cv2.COLOR_RGB2BGR, dst=frame)
 
                 # Write blocks to new video
                 if self.save_data:
@@ -494,9 +500,13 @@ class VideoProcessingPipeline:
         session_data.block_times.append(block_vars.time)
         n_inds_block = block_vars.frame_1 - block_vars.frame_0
         session_data.apriltag123_visible.append(np.zeros(n_inds_block))
-        landmark_pos_dict = {lm: np.zeros((2, n_inds_block)) for lm in session_data.tracked_landmarks.values()}
+        landmark_pos_dict = {
+            lm: np.zeros((2, n_inds_block), dtype=COORD_DTYPE) for lm in session_data.tracked_landmarks.values()
+        }
         session_data.hand_landmark_pos_abs.append(landmark_pos_dict)
-        session_data.reference_pos_abs.append({ref: np.zeros((2, n_inds_block)) for ref in self.ref_tag_ids})
+        session_data.reference_pos_abs.append(
+            {ref: np.zeros((2, n_inds_block), dtype=COORD_DTYPE) for ref in self.ref_tag_ids}
+        )
         block_vars.event_onsets = session_data.event_onsets_blocks[block_vars.block_id]
 
         # OpenCV video writer, used to create block videos
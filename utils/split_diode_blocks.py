@@ -1,6 +1,7 @@
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
+from numpy.lib.stride_tricks import sliding_window_view
 pd.options.mode.chained_assignment = None
 
 N_EDGES_APRILTAG_SET = 10
@@ -77,9 +78,9 @@ def get_block_data(
     event_onset_times = []
     for i, block in enumerate(all_blocks):
         # Calculate a list of all threshold crossings
-        block_time = block.time.to_numpy('float', copy=True)
-        block_light_values = block.light_value.to_numpy('int', copy=True)
-        block_crossings = np.where(np.diff(block_light_values > diode_threshold))[0]
+        block_time = block.time.to_numpy()
+        block_light_values = block.light_value.to_numpy()
+        block_crossings = np.flatnonzero(np.diff(block_light_values > diode_threshold))
 
         # Get the event onset times, calculated depending on the threshold scenario
         last_event_ind = get_last_event_ind(
@@ -162,29 +163,30 @@ def get_apriltag_sets(diode_df: pd.DataFrame, diode_threshold: int) -> list[int]
         first_apriltag_inds (list[int]): indices marking the start of each AprilTag set
     """
 
-    light_values = diode_df.light_value.to_numpy('int', copy=True)
-    diode_time = diode_df.time.to_numpy('float', copy=True)
-    all_crossings = np.where(np.diff(light_values > diode_threshold))[0]
+    light_values = diode_df.light_value.to_numpy()
+    diode_time = diode_df.time.to_numpy()
+    all_crossings = np.flatnonzero(np.diff(light_values > diode_threshold))
+    if all_crossings.size <= N_EDGES_APRILTAG_SET:
+        return []
+
+    # Each row contains the crossing times of a candidate AprilTag set, starting at that crossing
+    time_sets = sliding_window_view(diode_time[all_crossings], N_EDGES_APRILTAG_SET)[:-1]
+    # Identify AprilTag sets by the time between the first and last edge (~9 seconds)
+    set_durations = time_sets[:, -1] - time_sets[:, 0]
+    # Each AprilTag should be visible for ~1 second, and there should be exactly 5 AprilTags in a set
+    tag_durations = time_sets[:, 1::2] - time_sets[:, ::2]
+    is_apriltag_set = (
+        (8.9 < set_durations) & (set_durations < 9.3)
+        & np.all((0.9 < tag_durations) & (tag_durations < 1.10), axis=1)
+    )
+
+    # Once a full AprilTag set is identified, skip over it
     first_apriltag_inds = []
-    skip_tags = 0
-    for i, ind in enumerate(all_crossings[:-N_EDGES_APRILTAG_SET]):
-        # Once a full AprilTag set is identified, skip over it
-        if skip_tags > 0:
-            skip_tags -= 1
-            continue
-        ind_set = all_crossings[i:i + N_EDGES_APRILTAG_SET]
-        time_set = diode_time[ind_set]
-        # Identify AprilTag sets by the time between the first and last edge (~9 seconds)
-        if 8.9 < time_set[-1] - time_set[0] < 9.3:
-            n_tags = 0
-            # Each AprilTag should be visible for ~1 second
-            for t1, t2 in zip(time_set[::2], time_set[1::2]):
-                if 0.9 < t2 - t1 < 1.10:
-                    n_tags += 1
-            # There should be exactly 5 AprilTags in a set
-            if n_tags == N_APRILTAGS:
-                skip_tags = N_EDGES_APRILTAG_SET - 1
-                first_apriltag_inds.append(ind)
+    next_set_start = 0
+    for i in np.flatnonzero(is_apriltag_set):
+        if i >= next_set_start:
+            first_apriltag_inds.append(all_crossings[i])
+            next_set_start = i + N_EDGES_APRILTAG_SET
 
     return first_apriltag_inds
 
@@ -200,15 +202,12 @@ def separate_blocks(diode_df: pd.DataFrame, apriltag_inds: list[int]) -> list[pd
         all_blocks (list[pd.DataFrame]): all diode data blocks, separated by AprilTag sets
     """
 
+    block_ends = [*apriltag_inds[1:], None]
     all_blocks = []
-    for i, ind1 in enumerate(apriltag_inds):
-        if i < len(apriltag_inds) - 1:
-            ind2 = apriltag_inds[i + 1]
-            block = diode_df.iloc[ind1:ind2, :]
-        else:
-            block = diode_df.iloc[ind1:, :]
-        block.time -= block.time.iloc[0]
-        block.reset_index(drop=True, inplace=True)
+    for ind1, ind2 in zip(apriltag_inds, block_ends):
+        block = diode_df.iloc[ind1:ind2].reset_index(drop=True)
+        block_time = block.time.to_numpy()
+        block["time"] = block_time - block_time[0]
         all_blocks.append(block)
 
     return all_blocks